@@ -6,11 +6,13 @@
 # skip/verify existing files, and resume.
 # Adds jittered delays, browser-like headers, and simple retries to look more like a human.
 #
-# Requirements: aiohttp, aiofiles, yarl, beautifulsoup4
-#   pip install aiohttp aiofiles yarl beautifulsoup4
+# Requirements: aiohttp, yarl
+#   pip install aiohttp yarl
 
 import asyncio
+import os
 import random
+from collections import deque
 import re
 import sys
 import socket
@@ -18,16 +20,21 @@ from pathlib import Path
 from typing import List, Tuple, Optional
 from urllib.parse import urljoin
 
-import aiofiles
 import aiohttp
-from bs4 import BeautifulSoup
 from yarl import URL
 
 # -------- config defaults --------
 DEFAULT_CONCURRENCY = 1
 DEFAULT_MIN_INTERVAL = 60.0
-# match GRIB2 + optional idx sidecars
-FILE_RE = re.compile(r'(?:^|/)(?P<prefix>(flxf|ocnf))[^/]*\.(?P<ext>grb2|grib2|idx)$', re.IGNORECASE)
+# CFS basenames are rigid (e.g. flxf2025100218.01.2025100218.grb2), so plain
+# prefix/suffix checks on the lowercased basename replace a regex entirely
+FILE_PREFIXES = ('flxf', 'ocnf')
+FILE_SUFFIXES = ('.grb2', '.grib2', '.idx')
+# autoindex pages are uniform machine-generated HTML; a compiled regex is all
+# we need to pull href attributes (no tree construction)
+HREF_RE = re.compile(r'href="([^"]+)"', re.IGNORECASE)
+# hrefs to drop before urljoin: parent/self links, anchors, and the empty string
+_SKIP_HREFS = frozenset({'../', './', '#', ''})
 MAX_RETRIES = 5
 
 
@@ -60,12 +67,11 @@ async def fetch_html(session: aiohttp.ClientSession, url: str) -> str:
 
 
 def discover_links(base_url: str, html: str) -> List[str]:
-    soup = BeautifulSoup(html, 'html.parser')
     hrefs = []
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        # ignore parent directory links and anchors
-        if href in ('../', './', '#'):
+    for href in HREF_RE.findall(html):
+        # ignore parent directory links, anchors, and autoindex sort links
+        # (?C=N;O=D etc.) before paying for urljoin's URL parsing
+        if href in _SKIP_HREFS or href.startswith(('?', '#')):
             continue
         hrefs.append(urljoin(base_url, href))
     return hrefs
@@ -134,9 +140,19 @@ async def download_file(
                     # Any HTTP non-200 is treated as a hard error (do NOT retry)
                     if status != 200:
                         return ("error_http", f"{url} -> HTTP {status}")
-                    async with aiofiles.open(dest, "wb") as f:
-                        async for chunk in r.content.iter_chunked(1 << 16):
-                            await f.write(chunk)
+                    # Preallocate when the server tells us the size so the kernel
+                    # can place contiguous extents, then stream 1 MiB chunks with
+                    # one executor hop per chunk (vs aiofiles' per-write submission
+                    # of 64 KiB pieces).
+                    loop = asyncio.get_running_loop()
+                    fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                    try:
+                        if r.content_length and hasattr(os, "posix_fallocate"):
+                            os.posix_fallocate(fd, 0, r.content_length)
+                        async for chunk in r.content.iter_chunked(1 << 20):
+                            await loop.run_in_executor(None, os.write, fd, chunk)
+                    finally:
+                        os.close(fd)
                     return ("downloaded", str(dest))
             except (aiohttp.ClientError, asyncio.TimeoutError, socket.gaierror) as e:
                 attempts += 1
@@ -159,17 +175,16 @@ async def crawl_and_download(
     Crawl base_url up to max_depth subdirectories, schedule downloads for FLXF/OCNF
     (and optionally .idx). Uses a semaphore to limit concurrency.
     """
-    seen_dirs = set()
+    seen_dirs = {base_url}
     file_urls: List[str] = []
 
     async with aiohttp.ClientSession() as session:
-        # BFS over directories
-        queue: List[Tuple[str, int]] = [(base_url, 0)]
+        # BFS over directories; deque gives O(1) popleft vs list.pop(0)
+        queue: deque[Tuple[str, int]] = deque([(base_url, 0)])
         while queue:
-            cur, depth = queue.pop(0)
-            if cur in seen_dirs or depth > max_depth:
+            cur, depth = queue.popleft()
+            if depth > max_depth:
                 continue
-            seen_dirs.add(cur)
             try:
                 html = await fetch_html(session, cur)
             except Exception as e:
@@ -178,13 +193,17 @@ async def crawl_and_download(
             links = discover_links(cur, html)
             for link in links:
                 if is_dir_link(link):
-                    queue.append((link, depth + 1))
+                    # dedupe on enqueue so repeated links never enter the queue
+                    if link not in seen_dirs:
+                        seen_dirs.add(link)
+                        queue.append((link, depth + 1))
                 else:
-                    m = FILE_RE.search(link)
-                    if not m:
+                    name = link.rsplit('/', 1)[-1].lower()
+                    if not name.endswith(FILE_SUFFIXES):
                         continue
-                    ext = m.group("ext").lower()
-                    if ext == "idx" and not include_idx:
+                    if not name.startswith(FILE_PREFIXES):
+                        continue
+                    if name.endswith('.idx') and not include_idx:
                         continue
                     file_urls.append(link)
 
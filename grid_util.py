@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 from typing import Optional
 from eccodes import (  # type: ignore
     codes_grib_new_from_file,
@@ -9,11 +10,17 @@ from eccodes import (  # type: ignore
 )
 
 
+UTC = timezone.utc
+
+
 def _to_utc_iso(dt: datetime) -> str:
+    if dt.tzinfo is UTC:
+        # Common case: callers hand us aware UTC datetimes already.
+        return dt.isoformat()
     if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
+        dt = dt.replace(tzinfo=UTC)
     else:
-        dt = dt.astimezone(timezone.utc)
+        dt = dt.astimezone(UTC)
     return dt.isoformat()
 
 
@@ -34,6 +41,29 @@ def _get_str_or_none(h, key: str) -> Optional[str]:
         return None
 
 
+@lru_cache(maxsize=None)
+def _ref_from_ints(dataDate: int, dataTime: int) -> datetime:
+    HH = dataTime // 100 if dataTime >= 100 else dataTime
+    # Direct construction from the packed YYYYMMDD int; strptime is far too
+    # slow for a per-message call.
+    return datetime(dataDate // 10000, dataDate // 100 % 100, dataDate % 100, HH, tzinfo=UTC)
+
+
+@lru_cache(maxsize=None)
+def _ref_epoch_from_ints(dataDate: int, dataTime: int) -> int:
+    return int(_ref_from_ints(dataDate, dataTime).timestamp())
+
+
+@lru_cache(maxsize=16384)
+def _epoch_to_utc_iso(epoch: int) -> str:
+    """
+    Render unix seconds as the UTC ISO8601 form the API emits, memoized:
+    forecast hours repeat across records and across requests, so each distinct
+    epoch is formatted once.
+    """
+    return datetime.fromtimestamp(epoch, UTC).isoformat()
+
+
 def _compute_times_from_message(h) -> tuple[datetime, datetime, int]:
     """
     Return (ref_time_utc, forecast_time_utc, lead_hours).
@@ -43,8 +73,7 @@ def _compute_times_from_message(h) -> tuple[datetime, datetime, int]:
     if dataDate is None or dataTime is None:
         raise ValueError("Missing reference time (dataDate/dataTime) in GRIB message")
 
-    HH = dataTime // 100 if dataTime >= 100 else dataTime
-    ref = datetime.strptime(f"{dataDate:08d}{HH:02d}", "%Y%m%d%H").replace(tzinfo=timezone.utc)
+    ref = _ref_from_ints(dataDate, dataTime)
 
     lead_hours = _get_int_or_none(h, "forecastTime")
     if lead_hours is None:
@@ -53,4 +82,22 @@ def _compute_times_from_message(h) -> tuple[datetime, datetime, int]:
     return ref, forecast, int(lead_hours)
 
 
+def _compute_time_epochs_from_message(h) -> tuple[int, int, int]:
+    """
+    Return (ref_epoch, forecast_epoch, lead_hours) as unix seconds UTC, with the
+    reference epoch memoized on the raw (dataDate, dataTime) ints — most messages
+    in a file share the same run, so the conversion runs once per unique tuple.
+    """
+    dataDate = _get_int_or_none(h, "dataDate")
+    dataTime = _get_int_or_none(h, "dataTime")
+    if dataDate is None or dataTime is None:
+        raise ValueError("Missing reference time (dataDate/dataTime) in GRIB message")
+
+    lead_hours = _get_int_or_none(h, "forecastTime")
+    if lead_hours is None:
+        raise ValueError("Unable to determine forecast lead time (hours)")
+    ref_epoch = _ref_epoch_from_ints(dataDate, dataTime)
+    return ref_epoch, ref_epoch + int(lead_hours) * 3600, int(lead_hours)
+
+
 GRIB_INDEX_SQLITE = "grib_index.sqlite"
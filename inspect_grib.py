@@ -6,6 +6,10 @@ import numpy as np
 import xarray as xr
 
 
+LON_CANDIDATES = ("longitude", "lon", "x")
+LAT_CANDIDATES = ("latitude", "lat", "y")
+
+
 def _fmt_range(a):
     try:
         vmin = float(np.nanmin(a.values))
@@ -81,14 +85,12 @@ def _print_dataset_summary(ds: xr.Dataset, title: str):
         print(f"  - {name}: " + ", ".join(info))
 
     # Lon/Lat quick summary if present
-    for lon_name in ["longitude", "lon", "x"]:
-        if lon_name in ds.coords:
-            print(f"\n{lon_name} range: {_fmt_range(ds.coords[lon_name])}")
-            break
-    for lat_name in ["latitude", "lat", "y"]:
-        if lat_name in ds.coords:
-            print(f"{lat_name} range: {_fmt_range(ds.coords[lat_name])}")
-            break
+    lon_name = next((n for n in LON_CANDIDATES if n in ds.coords), None)
+    if lon_name:
+        print(f"\n{lon_name} range: {_fmt_range(ds.coords[lon_name])}")
+    lat_name = next((n for n in LAT_CANDIDATES if n in ds.coords), None)
+    if lat_name:
+        print(f"{lat_name} range: {_fmt_range(ds.coords[lat_name])}")
 
     # Time-ish
     for tname in ["time", "valid_time", "forecast_reference_time", "step"]:
@@ -2,8 +2,8 @@
 # Utilities for query time handling and nearest-record query
 import logging
 import sqlite3
-from collections.abc import Sequence, Mapping
-from contextlib import closing
+import threading
+from datetime import datetime, timezone
 from typing import Optional
 import sys
 import multiprocessing as mp
@@ -15,12 +15,11 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 import numpy as np
 from eccodes import (  # type: ignore
     codes_grib_new_from_file,
-    codes_grib_get_data,
-    codes_get, codes_get_long,
+    codes_get, codes_get_array, codes_get_long,
     codes_release, codes_get_values
 )
 
-from grid_util import _to_utc_iso, GRIB_INDEX_SQLITE, _get_str_or_none, _get_int_or_none
+from grid_util import _to_utc_iso, _epoch_to_utc_iso, GRIB_INDEX_SQLITE, _get_str_or_none, _get_int_or_none
 
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
@@ -32,7 +31,6 @@ def _to_iso_str_or_passthrough(t) -> str:
     if isinstance(t, str):
         # Try to normalize strings that include an explicit timezone
         if "Z" in t or "+" in t or "-" in t[10:]:
-            from datetime import datetime
             dt = datetime.fromisoformat(t.replace("Z", "+00:00"))
             return _to_utc_iso(dt)
         return t
@@ -40,35 +38,80 @@ def _to_iso_str_or_passthrough(t) -> str:
         return _to_utc_iso(t)
 
 
+@lru_cache(maxsize=4096)
+def _epoch_from_iso(s: str) -> int:
+    """
+    ISO8601 string -> unix seconds UTC, memoized: API clients hammer the same
+    window bounds, so each distinct string is parsed once.
+    """
+    dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def _to_epoch_seconds(t) -> int:
+    """
+    Accepts a datetime (naive or tz-aware, naive assumed UTC) or an ISO8601
+    string and returns unix seconds UTC.
+    """
+    if isinstance(t, str):
+        return _epoch_from_iso(t)
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return int(t.timestamp())
+
+
+def _render_record_times(rec: dict) -> dict:
+    """Attach human-readable ISO forms alongside the stored epoch columns."""
+    rec["ref_time_utc"] = _epoch_to_utc_iso(rec["ref_time_utc_epoch"])
+    rec["forecast_time_utc"] = _epoch_to_utc_iso(rec["forecast_time_utc_epoch"])
+    return rec
+
+
+# One read connection per thread, opened lazily and kept for the thread's
+# lifetime: API handlers hit these queries on every request and reconnecting
+# (plus re-running PRAGMAs) per call is pure overhead.  Readers never write,
+# so a long-lived connection is safe under WAL.
+_conn_local = threading.local()
+
+
+def _read_conn() -> sqlite3.Connection:
+    conn = getattr(_conn_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(GRIB_INDEX_SQLITE, cached_statements=512)
+        conn.execute("PRAGMA busy_timeout=8000;")
+        _conn_local.conn = conn
+    return conn
+
+
 def query_nearest_record(query_time, level_type: str, var: str) -> Optional[dict]:
     """
     Return the single best-matching record for `var` and `level_type` whose forecast_time_utc is
     closest to `query_time`. In a tie on closeness, choose the newest by ref_time_utc.
     """
-    qt_iso = _to_iso_str_or_passthrough(query_time)
+    qt_epoch = _to_epoch_seconds(query_time)
     sql = """
           SELECT id,
                  file_path,
                  var,
                  level_type,
-                 ref_time_utc,
-                 forecast_time_utc,
+                 ref_time_utc_epoch,
+                 forecast_time_utc_epoch,
                  lead_hours,
-                 ABS((julianday(forecast_time_utc) - julianday(?)) * 24.0) AS delta_hours
+                 ABS(forecast_time_utc_epoch - ?) / 3600.0 AS delta_hours
           FROM records
           WHERE var = ?
             AND level_type = ?
           ORDER BY delta_hours ASC,
-                   ref_time_utc DESC LIMIT 1; \
+                   ref_time_utc_epoch DESC LIMIT 1; \
           """
-    with closing(sqlite3.connect(GRIB_INDEX_SQLITE)) as conn:
-        conn.execute("PRAGMA busy_timeout=8000;")
-        cur = conn.execute(sql, (qt_iso, var, level_type))
-        row = cur.fetchone()
-        if not row:
-            return None
-        cols = [d[0] for d in cur.description]
-        return dict(zip(cols, row))
+    cur = _read_conn().execute(sql, (qt_epoch, var, level_type))
+    row = cur.fetchone()
+    if not row:
+        return None
+    cols = [d[0] for d in cur.description]
+    return _render_record_times(dict(zip(cols, row)))
 
 
 def query_records_in_range(start_time, end_time, level_type: str, var: str) -> list[dict]:
@@ -76,36 +119,34 @@ def query_records_in_range(start_time, end_time, level_type: str, var: str) -> l
     Return newest-by-ref_time entries for each forecast_time_utc within [start_time, end_time] (inclusive),
     filtered by var and level_type, ordered by forecast_time_utc ASC.
     """
-    start_iso = _to_iso_str_or_passthrough(start_time)
-    end_iso = _to_iso_str_or_passthrough(end_time)
+    start_epoch = _to_epoch_seconds(start_time)
+    end_epoch = _to_epoch_seconds(end_time)
     sql = """
           WITH ranked AS (SELECT id,
                                  file_path,
                                  var,
                                  level_type,
-                                 ref_time_utc,
-                                 forecast_time_utc,
+                                 ref_time_utc_epoch,
+                                 forecast_time_utc_epoch,
                                  lead_hours,
                                  ROW_NUMBER() OVER (
-          PARTITION BY var, level_type, forecast_time_utc
-          ORDER BY ref_time_utc DESC
+          PARTITION BY var, level_type, forecast_time_utc_epoch
+          ORDER BY ref_time_utc_epoch DESC
         ) AS rn
                           FROM records
                           WHERE var = ?
                             AND level_type = ?
-                            AND forecast_time_utc >= ?
-                            AND forecast_time_utc <= ?)
-          SELECT id, file_path, var, level_type, ref_time_utc, forecast_time_utc, lead_hours
+                            AND forecast_time_utc_epoch >= ?
+                            AND forecast_time_utc_epoch <= ?)
+          SELECT id, file_path, var, level_type, ref_time_utc_epoch, forecast_time_utc_epoch, lead_hours
           FROM ranked
           WHERE rn = 1
-          ORDER BY forecast_time_utc ASC; \
+          ORDER BY forecast_time_utc_epoch ASC; \
           """
-    with closing(sqlite3.connect(GRIB_INDEX_SQLITE)) as conn:
-        conn.execute("PRAGMA busy_timeout=8000;")
-        cur = conn.execute(sql, (var, level_type, start_iso, end_iso))
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        return [dict(zip(cols, r)) for r in rows]
+    cur = _read_conn().execute(sql, (var, level_type, start_epoch, end_epoch))
+    rows = cur.fetchall()
+    cols = [d[0] for d in cur.description]
+    return [_render_record_times(dict(zip(cols, r))) for r in rows]
 
 
 def _msg_matches(h, *, var: str, level_type: str) -> bool:
@@ -142,17 +183,42 @@ def _grid_shape(h) -> tuple[int, int]:
     raise ValueError("Unable to determine grid shape (nx/ny).")
 
 
+def _monotonic_axis_range(axis: np.ndarray, lo: float, hi: float) -> tuple[int, int]:
+    """
+    [start, stop) covering values in [lo, hi] on a monotonic 1D axis
+    (ascending or descending), via binary search instead of a full-axis mask.
+    """
+    n = axis.shape[0]
+    if axis[0] <= axis[-1]:
+        start = np.searchsorted(axis, lo, side="left")
+        stop = np.searchsorted(axis, hi, side="right")
+    else:
+        rev = axis[::-1]
+        start = n - np.searchsorted(rev, hi, side="right")
+        stop = n - np.searchsorted(rev, lo, side="left")
+    return int(start), int(stop)
+
+
 def _subset_bbox_from_arrays(vals: np.ndarray, lats: np.ndarray, lons: np.ndarray,
                              bbox: tuple[float, float, float, float],
                              ny: int, nx: int):
     """
-    Reshape 1D arrays to (ny, nx), then mask to bbox and return cropped arrays.
+    Reshape 1D arrays to (ny, nx), then crop to bbox and return cropped arrays.
     bbox = (min_lat, min_lon, max_lat, max_lon)
     """
     vals2 = vals.reshape(ny, nx)
     lat2 = lats.reshape(ny, nx)
     lon2 = lons.reshape(ny, nx)
     min_lat, min_lon, max_lat, max_lon = bbox
+    lat_axis = lat2[:, 0]
+    lon_axis = lon2[0, :]
+    lat_diff = np.diff(lat_axis)
+    lon_diff = np.diff(lon_axis)
+    if (np.all(lat_diff >= 0) or np.all(lat_diff <= 0)) and (np.all(lon_diff >= 0) or np.all(lon_diff <= 0)):
+        # Regular grid: two binary searches per axis replace the O(ny*nx) mask.
+        y0, y1 = _monotonic_axis_range(lat_axis, min_lat, max_lat)
+        x0, x1 = _monotonic_axis_range(lon_axis, min_lon, max_lon)
+        return vals2[y0:y1, x0:x1], lat2[y0:y1, x0:x1], lon2[y0:y1, x0:x1]
     mask = (lat2 >= min_lat) & (lat2 <= max_lat) & (lon2 >= min_lon) & (lon2 <= max_lon)
     if not mask.any():
         # Return empty slices to signal no overlap
@@ -164,11 +230,12 @@ def _subset_bbox_from_arrays(vals: np.ndarray, lats: np.ndarray, lons: np.ndarra
 
 
 @lru_cache(maxsize=40960)
-def _cached_grib_triplets(file_path: str, var: str, level_type: str):
+def _cached_grib_arrays(file_path: str, var: str, level_type: str):
     """
-    Cache ecCodes triplets for (file_path, var, level_type).
-    Returns the raw result of codes_grib_get_data(h) for the *first* matching message.
-    Only supports the dict-sequence shape: [{'lat':..., 'lon':..., 'value':...}, ...].
+    Cache field arrays for (file_path, var, level_type).
+    Returns (vals, lats, lons) float64 ndarrays for the *first* matching message,
+    read in bulk via codes_get_values/codes_get_array — one C call per array
+    instead of one dict per grid point.
     """
     # Normalize path so cache isn't split by relative vs absolute
     fp = os.path.abspath(file_path)
@@ -179,12 +246,14 @@ def _cached_grib_triplets(file_path: str, var: str, level_type: str):
                 break
             try:
                 if _msg_matches(h, var=var, level_type=level_type):
-                    raw = codes_grib_get_data(h)
-                    if not (isinstance(raw, Sequence) and len(raw) > 0 and isinstance(raw[0], Mapping)
-                            and all(k in raw[0] for k in ("lat", "lon", "value"))):
-                        raise TypeError(
-                            "codes_grib_get_data() must return a sequence of {'lat','lon','value'} mappings")
-                    return raw
+                    # Contiguous float64 up front: every later mask/index runs
+                    # on these cached arrays, so pay any conversion cost once here.
+                    vals = np.ascontiguousarray(codes_get_values(h), dtype=np.float64)
+                    lats = np.ascontiguousarray(codes_get_array(h, "latitudes"), dtype=np.float64)
+                    lons = np.ascontiguousarray(codes_get_array(h, "longitudes"), dtype=np.float64)
+                    if not (vals.shape == lats.shape == lons.shape):
+                        raise TypeError("values/latitudes/longitudes arrays disagree in shape")
+                    return vals, lats, lons
             finally:
                 if 'h' in locals() and h is not None:
                     codes_release(h)
@@ -192,6 +261,49 @@ def _cached_grib_triplets(file_path: str, var: str, level_type: str):
     return ()
 
 
+# (grid fingerprint, bbox) -> flat indices of the grid points inside the bbox.
+# CFS grids are fixed per product, so the O(N) mask scan runs once per
+# (grid, bbox) pair and repeat queries reuse the indices.
+_BBOX_INDEX_CACHE: dict[tuple, np.ndarray] = {}
+
+
+def _bbox_indices(lats: np.ndarray, lons: np.ndarray,
+                  bbox: tuple[float, float, float, float]) -> np.ndarray:
+    """
+    Return flat indices of points inside bbox, cached per (grid, bbox).
+    The grid fingerprint (size + corner coordinates) distinguishes the grids
+    that appear in practice without hashing whole coordinate arrays.
+    """
+    min_lat, min_lon, max_lat, max_lon = bbox
+    if max_lon - min_lon >= 360.0:
+        # Full longitude span (the API documents lon bounds in [0, 360], so
+        # e.g. (0, 360) means every meridian). Folding 360 to 0 here would
+        # silently shrink the request to the lon == 0 meridian.
+        min_lon, max_lon = 0.0, 360.0
+    else:
+        # Grid longitudes are [0, 360); normalize out-of-range bounds the same
+        # way so e.g. -10 and 350 land in the same cache slot and compare
+        # correctly. In-range values (including 360 handled above) stay put.
+        if not 0.0 <= min_lon < 360.0:
+            min_lon %= 360.0
+        if not 0.0 <= max_lon < 360.0:
+            max_lon %= 360.0
+    key = (lats.shape[0],
+           float(lats[0]), float(lats[-1]), float(lons[0]), float(lons[-1]),
+           (min_lat, min_lon, max_lat, max_lon))
+    idx = _BBOX_INDEX_CACHE.get(key)
+    if idx is None:
+        if min_lon <= max_lon:
+            lon_m = (lons >= min_lon) & (lons <= max_lon)
+        else:
+            # bbox wraps across the 0/360 seam (API allows lon_max < lon_min)
+            lon_m = (lons >= min_lon) | (lons <= max_lon)
+        m = (lats >= min_lat) & (lats <= max_lat) & lon_m
+        idx = np.flatnonzero(m)
+        _BBOX_INDEX_CACHE[key] = idx
+    return idx
+
+
 def _process_record_worker(rec: dict, var: str, level_type: str, bbox: tuple[float, float, float, float]) -> list[dict]:
     """
     Worker to extract all bbox points for a single record (newest per forecast) using ecCodes.
@@ -200,34 +312,33 @@ def _process_record_worker(rec: dict, var: str, level_type: str, bbox: tuple[flo
     fp = rec["file_path"]
     out: list[dict] = []
     try:
-        raw = _cached_grib_triplets(fp, var, level_type)
+        raw = _cached_grib_arrays(fp, var, level_type)
         if not raw:
             return out
-        npts = len(raw)
-        lats = np.fromiter((item["lat"] for item in raw), dtype=float, count=npts)
-        lons = np.fromiter((item["lon"] for item in raw), dtype=float, count=npts)
-        vals = np.fromiter((item["value"] for item in raw), dtype=float, count=npts)
-        min_lat, min_lon, max_lat, max_lon = bbox
-        m = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
-        if m.any():
+        vals, lats, lons = raw
+        m = _bbox_indices(lats, lons, bbox)
+        if m.size:
             vt_iso = rec["forecast_time_utc"]
             create_time = rec["ref_time_utc"]
             path = fp
-            sel_vals = vals[m]
-            sel_lats = lats[m]
-            sel_lons = lons[m]
+            # tolist() converts each selected column to native floats in one C
+            # pass instead of a float() call per element inside the row loop
+            sel_vals = vals[m].tolist()
+            sel_lats = lats[m].tolist()
+            sel_lons = lons[m].tolist()
+            json_key = var + '_' + level_type
             out.extend(
                 {
                     "prediction_time": vt_iso,
                     "create_time": create_time,
                     "type": var,
                     "level": level_type,
-                    "json_key": var + '_' + level_type,
-                    "value_min": float(val),
-                    "value_max": float(val),
+                    "json_key": json_key,
+                    "value_min": val,
+                    "value_max": val,
                     "path": path,
-                    "lat": float(la),
-                    "lon": float(lo),
+                    "lat": la,
+                    "lon": lo,
                 }
                 for val, la, lo in zip(sel_vals, sel_lats, sel_lons)
             )